@@ -1,5 +1,11 @@
+import base64
+import functools
+import io
+
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import plotly.graph_objects as go
 import numpy as np
 import plotly.express as px
@@ -79,12 +85,10 @@ def normalize_welllist(df_welllist: pd.DataFrame) -> pd.DataFrame | None:
 # Function: Calculate Well Statistics
 # --------------------------------------------------
 def calculate_well_statistics(prod_df, inj_df):
-    # Ensure Date column is datetime
-    prod_df["Date"] = pd.to_datetime(prod_df["Date"], errors="coerce")
-    inj_df["Date"] = pd.to_datetime(inj_df["Date"], errors="coerce")
+    # Date is already datetime64, parsed once in parse_history_csv
 
     # Production summary
-    prod_summary = prod_df.groupby("UWI").agg(
+    prod_summary = prod_df.groupby("UWI", observed=True).agg(
         start_date=("Date", "min"),
         end_date=("Date", "max"),
         days_active=("Date", "nunique"),
@@ -97,7 +101,7 @@ def calculate_well_statistics(prod_df, inj_df):
     ).reset_index()
 
     # Injection summary
-    inj_summary = inj_df.groupby("UWI").agg(
+    inj_summary = inj_df.groupby("UWI", observed=True).agg(
         inj_start=("Date", "min"),
         inj_end=("Date", "max"),
         inj_days=("Date", "nunique"),
@@ -121,7 +125,6 @@ def calculate_well_statistics(prod_df, inj_df):
 # Function: Monthly/Yearly Totals
 # --------------------------------------------------
 def calculate_time_totals(df, freq="M"):
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
     return df.groupby(pd.Grouper(key="Date", freq=freq)).agg(
         oil_total=("Oil M3", "sum"),
         gas_total=("Gas E3M3", "sum"),
@@ -176,56 +179,224 @@ def display_statistics_and_analysis(prod_df, inj_df):
 # --------------------------------------------------
 # Function to read CSV
 # --------------------------------------------------
+# Numeric columns stored as float32 to halve memory and Plotly payloads
+FLOAT32_COLUMNS = [
+    "Water M3", "Oil M3", "Gas E3M3", "Water Inj M3",
+    "Longitude NAD 83", "Latitude NAD 83"
+]
+
+
+# Columns the app reads from the production/injection histories
+HISTORY_COLUMNS = ["UWI", "Date", "Water M3", "Oil M3", "Gas E3M3", "Water Inj M3"]
+
+
+# History files are streamed in blocks of this size (see parse_history_csv)
+HISTORY_BLOCK_BYTES = 16 << 20
+
+
+# Explicit Arrow types: inference only looks at the first block, so a column
+# that starts blank or integral would reject later values. Volumes and
+# coordinates are parsed straight to float32; Date stays a string so
+# pd.to_datetime(errors="coerce") can turn bad dates into NaT.
+ARROW_COLUMN_TYPES = {
+    "UWI": pa.dictionary(pa.int32(), pa.string()),
+    "Date": pa.string(),
+    **{col: pa.float32() for col in FLOAT32_COLUMNS}
+}
+
+
+def read_arrow_csv(data: bytes, columns=None) -> pd.DataFrame:
+    # pyarrow parses blocks on all cores. UWI is dictionary-encoded so it
+    # arrives as a pandas categorical without an object-dtype pass.
+    convert_options = pa_csv.ConvertOptions(
+        column_types=ARROW_COLUMN_TYPES,
+        include_columns=columns,
+        strings_can_be_null=True
+    )
+    table = pa_csv.read_csv(io.BytesIO(data), convert_options=convert_options)
+    # self_destruct frees each Arrow column as it is converted
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+
+    if "UWI" in df.columns:
+        # Dictionary order follows first appearance; sort it like read_csv does
+        df["UWI"] = df["UWI"].cat.set_categories(df["UWI"].cat.categories.sort_values())
+    return df
+
+
+def history_chunk(batch) -> pd.DataFrame:
+    chunk = batch.to_pandas(split_blocks=True)
+    if "Date" in chunk.columns:
+        chunk["Date"] = pd.to_datetime(chunk["Date"], errors="coerce")
+    return chunk
+
+
+def parse_history_csv(data: bytes) -> pd.DataFrame:
+    # Only the used columns are parsed at all; required-but-missing columns
+    # are left for validation to report
+    header = pa_csv.open_csv(io.BytesIO(data)).schema.names
+    convert_options = pa_csv.ConvertOptions(
+        column_types=ARROW_COLUMN_TYPES,
+        include_columns=[col for col in header if col in HISTORY_COLUMNS],
+        strings_can_be_null=True
+    )
+    reader = pa_csv.open_csv(
+        io.BytesIO(data),
+        read_options=pa_csv.ReadOptions(block_size=HISTORY_BLOCK_BYTES),
+        convert_options=convert_options
+    )
+    # Stream record batches so Date only exists as Python strings one batch
+    # at a time, before it is parsed to datetime64
+    chunks = [history_chunk(batch) for batch in reader]
+    if not chunks:
+        chunks.append(history_chunk(reader.schema.empty_table()))
+    if "UWI" not in chunks[0].columns:
+        return pd.concat(chunks, ignore_index=True)
+
+    # Each batch has its own UWI dictionary; recode them onto one sorted
+    # dtype so the concatenated column stays categorical
+    categories = functools.reduce(pd.Index.union, (chunk["UWI"].cat.categories for chunk in chunks))
+    uwi_dtype = pd.CategoricalDtype(categories.sort_values())
+    for chunk in chunks:
+        chunk["UWI"] = chunk["UWI"].astype(uwi_dtype)
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+
+    # Keep each well's history contiguous so well_rows can binary-search it.
+    # Missing UWIs go first to keep the category codes monotonic.
+    return df.sort_values("UWI", kind="stable", na_position="first", ignore_index=True)
+
+
+@st.cache_data(show_spinner=False)
+def parse_csv_upload(file_key, _file) -> pd.DataFrame:
+    # Keyed on the upload's file_id, so a file is parsed once per upload
+    # instead of on every widget interaction, and its bytes are never hashed
+    return read_arrow_csv(_file.getvalue())
+
+
 def read_csv_file(file):
     try:
-        return pd.read_csv(file)
+        return parse_csv_upload(upload_key(file), file)
     except Exception as e:
         st.error(f"Error reading file {file.name}: {e}")
         return None
 
+
+def read_history_files(prod_file, inj_file):
+    try:
+        return load_histories(upload_key(prod_file), upload_key(inj_file), prod_file, inj_file)
+    except Exception as e:
+        st.error(f"Error reading history files {prod_file.name} / {inj_file.name}: {e}")
+        return None, None
+
 # --------------------------------------------------
-# Function to prepare well data for map
+# Function to key cached results on the uploaded files
 # --------------------------------------------------
-def prepare_well_data(welllist, prod, inj, include_unknown=True):
-    df = welllist.copy()
+def upload_key(*files):
+    # Streamlit assigns each upload a unique file_id, so the key costs nothing
+    # to build. Cached functions take this key and skip hashing their
+    # upload/DataFrame arguments (underscore-prefixed).
+    return ":".join(file.file_id for file in files)
+
 
-    df["Well_Type"] = "Unknown"
-    df.loc[df["UWI"].isin(prod["UWI"]), "Well_Type"] = "Production"
-    df.loc[df["UWI"].isin(inj["UWI"]), "Well_Type"] = "Injection"
+# --------------------------------------------------
+# Function to give history tables one shared, indexed UWI dtype
+# --------------------------------------------------
+def share_uwi_categories(*dfs):
+    # With identical categories, UWI comparisons and merges between the
+    # tables work on integer codes. Index.union keeps the categories sorted
+    # (as read_arrow_csv builds them), so UWI-sorted rows stay sorted by code.
+    categories = dfs[0]["UWI"].cat.categories
+    for df in dfs[1:]:
+        categories = categories.union(df["UWI"].cat.categories)
+
+    uwi_dtype = pd.CategoricalDtype(categories)
+    for df in dfs:
+        df["UWI"] = df["UWI"].astype(uwi_dtype)
+        # Mirror UWI into the (sorted) row index for well_rows. It is left
+        # unnamed so groupby("UWI") still resolves to the column.
+        df.index = pd.Index(df["UWI"].array)
+
+# --------------------------------------------------
+# Function to load both history files in one cached step
+# --------------------------------------------------
+@st.cache_data(show_spinner=False)
+def load_histories(prod_key, inj_key, _prod_file, _inj_file):
+    # Parsing, the shared UWI dtype and the UWI index all depend only on the
+    # two uploads, so a widget rerun reuses them instead of re-coding both
+    # tables
+    prod = parse_history_csv(_prod_file.getvalue())
+    inj = parse_history_csv(_inj_file.getvalue())
+    # A missing UWI column is left for validate_uploaded_files to report
+    if "UWI" in prod.columns and "UWI" in inj.columns:
+        share_uwi_categories(prod, inj)
+    return prod, inj
+
+# --------------------------------------------------
+# Function to prepare well data for map
+# --------------------------------------------------
+@st.cache_data(max_entries=8, show_spinner=False)
+def prepare_well_data(wells_key, _welllist, _prod, _inj, include_unknown=True):
+    # Cached on wells_key (see upload_key); the frames are not hashed
+    df = _welllist.copy()
+
+    # Injection wins when a UWI appears in both histories
+    well_types = {uwi: "Production" for uwi in _prod["UWI"].unique()}
+    well_types.update({uwi: "Injection" for uwi in _inj["UWI"].unique()})
+    df["Well_Type"] = pd.Categorical(
+        df["UWI"].map(well_types).fillna("Unknown"),
+        categories=["Production", "Injection", "Unknown"]
+    )
 
     deviation_col = "Deviation Ind" if "Deviation Ind" in df.columns else None
     if deviation_col:
-        df["Deviation_Type"] = df[deviation_col].apply(
-            lambda x: "Horizontal" if str(x).strip().upper().startswith("H") else "Vertical"
-        )
+        deviation = df[deviation_col].astype("string").str.strip().str.upper()
+        df["Deviation_Type"] = pd.Categorical(np.where(
+            deviation.str.startswith("H", na=False), "Horizontal", "Vertical"
+        ))
     else:
-        df["Deviation_Type"] = "Unknown"
+        df["Deviation_Type"] = pd.Categorical(["Unknown"] * len(df))
 
     df["Well_ID"] = range(1, len(df) + 1)
 
-    df["plot_lon"] = df["Longitude NAD 83"]
-    df["plot_lat"] = df["Latitude NAD 83"]
+    # Jitter wells sharing a surface location so every marker stays visible
+    plot_lon = df["Longitude NAD 83"].to_numpy(copy=True)
+    plot_lat = df["Latitude NAD 83"].to_numpy(copy=True)
 
-    dup_mask = df.duplicated(subset=["plot_lon", "plot_lat"], keep=False)
-    df.loc[dup_mask, "plot_lon"] += np.random.uniform(-0.0003, 0.0003, size=dup_mask.sum())
-    df.loc[dup_mask, "plot_lat"] += np.random.uniform(-0.0003, 0.0003, size=dup_mask.sum())
+    dup_idx = np.flatnonzero(
+        df.duplicated(subset=["Longitude NAD 83", "Latitude NAD 83"], keep=False).to_numpy()
+    )
+    jitter = np.random.default_rng().uniform(-0.0003, 0.0003, size=(dup_idx.size, 2))
+    plot_lon[dup_idx] += jitter[:, 0].astype(plot_lon.dtype)
+    plot_lat[dup_idx] += jitter[:, 1].astype(plot_lat.dtype)
+
+    df["plot_lon"] = plot_lon
+    df["plot_lat"] = plot_lat
 
     if not include_unknown:
-        df = df[df["Well_Type"] != "Unknown"]
+        df = df[df["Well_Type"] != "Unknown"].copy()
+        df["Well_Type"] = df["Well_Type"].cat.remove_unused_categories()
 
     return df
 
 # --------------------------------------------------
 # Function to plot map
 # --------------------------------------------------
-def plot_well_map(df, label_mode):
-    color_map = {
-        "Production": "blue",
-        "Injection": "red",
-        "Unknown": "gray"
-    }
+WELL_TYPE_COLORS = {
+    "Production": "blue",
+    "Injection": "red",
+    "Unknown": "gray"
+}
+
+# Above this many wells the map is drawn as a Datashader density image
+DENSITY_MAP_MIN_WELLS = 5000
+
 
+def plot_well_map(df, label_mode):
     import plotly.express as px
+    # WebGL keeps large well lists responsive (SVG draws one DOM node per
+    # marker). Browsers only allow ~8-16 live WebGL contexts per page, so the
+    # map stays a single figure and the history plots only use WebGL for
+    # merged many-well lines (see merged_line_trace).
     if label_mode == "Hover tooltips":
         fig = px.scatter(
             df, x="plot_lon", y="plot_lat",
@@ -233,16 +404,18 @@ def plot_well_map(df, label_mode):
             hover_data=["Well_ID", "UWI"],
             title="Well Location Grid Map",
             labels={"plot_lon": "Longitude", "plot_lat": "Latitude"},
-            color_discrete_map=color_map
+            color_discrete_map=WELL_TYPE_COLORS,
+            render_mode="webgl"
         )
     else:
+        # Visible labels stay on SVG, where text rendering is fully supported
         fig = px.scatter(
             df, x="plot_lon", y="plot_lat",
             color="Well_Type", symbol="Deviation_Type",
             text="Well_ID",
             title="Well Location Grid Map",
             labels={"plot_lon": "Longitude", "plot_lat": "Latitude"},
-            color_discrete_map=color_map
+            color_discrete_map=WELL_TYPE_COLORS
         )
         fig.update_traces(textposition="top center")
 
@@ -254,224 +427,277 @@ def plot_well_map(df, label_mode):
     return fig
 
 # --------------------------------------------------
-# Function to plot Water Injection vs Water Production History
+# Function to rasterize a very large well list
 # --------------------------------------------------
-def plot_water_inj_prod(prod_df, inj_df, prod_wells, inj_wells):
-    fig = go.Figure()
-
-    # Water production bars
-    for well in prod_wells:
-        data = prod_df[prod_df["UWI"] == well]
-        fig.add_trace(go.Bar(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Water M3"],
-            name=f"Water Production from well {well}",
-            yaxis="y2"
-        ))
-
-    # Water injection lines
-    for well in inj_wells:
-        data = inj_df[inj_df["UWI"] == well]
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Water Inj M3"],
-            name=f"Water Injection into Well {well}",
-            mode="lines+markers"
-        ))
-
-    # Calculate maximum for shared scale
-    max_val = 0
-    if prod_wells:
-        max_val = max(max_val, prod_df[prod_df["UWI"].isin(prod_wells)]["Water M3"].max())
-    if inj_wells:
-        max_val = max(max_val, inj_df[inj_df["UWI"].isin(inj_wells)]["Water Inj M3"].max())
+@st.cache_data(max_entries=8, show_spinner=False)
+def render_well_density(wells_key, include_unknown, _df):
+    import datashader as ds
+    import datashader.transfer_functions as tf
+
+    # Rasterize every well server-side, so the browser receives one PNG
+    # instead of the coordinates of each marker. Cached on the uploads, so
+    # changing the well selection only redraws the overlay.
+    x_range = (float(_df["plot_lon"].min()), float(_df["plot_lon"].max()))
+    y_range = (float(_df["plot_lat"].min()), float(_df["plot_lat"].max()))
+    # Canvas height follows the field's aspect ratio so pixels stay square
+    x_span = max(x_range[1] - x_range[0], 1e-9)
+    y_span = max(y_range[1] - y_range[0], 1e-9)
+    plot_height = int(np.clip(round(1000 * y_span / x_span), 1, 4000))
+
+    canvas = ds.Canvas(plot_width=1000, plot_height=plot_height, x_range=x_range, y_range=y_range)
+    agg = canvas.points(_df, "plot_lon", "plot_lat", ds.count_cat("Well_Type"))
+    img = tf.set_background(tf.shade(agg, color_key=WELL_TYPE_COLORS), "white").to_pil()
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    source = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+    return source, x_range, y_range
 
+# --------------------------------------------------
+# Function to plot a density map for very large well lists
+# --------------------------------------------------
+def plot_well_density_map(wells_key, include_unknown, df, selected_uwis):
+    source, x_range, y_range = render_well_density(wells_key, include_unknown, df)
+
+    # Only the selected wells are sent as interactive markers on top
+    selected = df[df["UWI"].isin(selected_uwis)]
+    fig = px.scatter(
+        selected, x="plot_lon", y="plot_lat",
+        color="Well_Type", symbol="Deviation_Type",
+        hover_data=["Well_ID", "UWI"],
+        title="Well Location Density Map",
+        labels={"plot_lon": "Longitude", "plot_lat": "Latitude"},
+        color_discrete_map=WELL_TYPE_COLORS,
+        render_mode="webgl"
+    )
+    fig.add_layout_image(
+        source=source, xref="x", yref="y",
+        x=x_range[0], y=y_range[1],
+        sizex=x_range[1] - x_range[0], sizey=y_range[1] - y_range[0],
+        sizing="stretch", layer="below"
+    )
+    # Same aspect lock as plot_well_map, so the field keeps its shape
     fig.update_layout(
-        title="Water Injection vs Water Production History",
-        xaxis=dict(title="Date (month)"),
-        yaxis=dict(title="Water Injection M3", range=[0, max_val]),
-        yaxis2=dict(title="Water Production M3", overlaying="y", side="right", range=[0, max_val]),
-        barmode="overlay"
+        xaxis=dict(showgrid=False, zeroline=False, range=x_range),
+        yaxis=dict(showgrid=False, zeroline=False, range=y_range, scaleanchor="x", scaleratio=1),
+        legend_title="Selected Wells"
     )
     return fig
 
 # --------------------------------------------------
-# Function to plot Oil Production vs Water Injection History
+# Function to fetch one well's rows from a UWI-sorted history
 # --------------------------------------------------
-def plot_oil_inj_prod(prod_df, inj_df, prod_wells, inj_wells):
-    fig = go.Figure()
+def well_rows(df, well):
+    # Label slice on the monotonic UWI index: pandas binary-searches the
+    # bounds instead of scanning the whole table
+    if not isinstance(df.index, pd.CategoricalIndex):
+        raise TypeError("well_rows needs a UWI-indexed history table from load_histories")
+    return df.loc[well:well]
 
-    # Oil production lines
-    for i, well in enumerate(prod_wells):
-        data = prod_df[prod_df["UWI"] == well]
-        oil_color = "brown" if i == 0 else None  # First production well = brown
-
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Oil M3"],
-            name=f"Oil Production from well {well}",
-            mode="lines+markers",
-            yaxis="y2",
-            line=dict(color=oil_color) if oil_color else {}
-        ))
-
-    # Water injection lines
-    for j, well in enumerate(inj_wells):
-        data = inj_df[inj_df["UWI"] == well]
-        inj_color = "blue" if j == 0 else None  # First injection well = blue
-
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Water Inj M3"],
-            name=f"Water Injection into Well {well}",
-            mode="lines+markers",
-            line=dict(color=inj_color) if inj_color else {}
-        ))
+# --------------------------------------------------
+# Function to fetch several wells' rows from a UWI-sorted history
+# --------------------------------------------------
+def select_wells(df, wells):
+    # Probes only the selected wells' ranges; rows of other wells are never read
+    return pd.concat([well_rows(df, well) for well in dict.fromkeys(wells)])
 
-    # Calculate maximum for shared scale
-    max_val = 0
-    if prod_wells:
-        max_val = max(max_val, prod_df[prod_df["UWI"].isin(prod_wells)]["Oil M3"].max())
-    if inj_wells:
-        max_val = max(max_val, inj_df[inj_df["UWI"].isin(inj_wells)]["Water Inj M3"].max())
+# --------------------------------------------------
+# Function to get the shared axis maximum for selected wells
+# --------------------------------------------------
+def max_for_wells(df, column, wells):
+    # Only the selected wells' row ranges are read. All-blank wells give NaN,
+    # which is reported as 0 so the other series' maximum still sets the axis.
+    max_val = pd.Series([well_rows(df, well)[column].max() for well in wells], dtype=float).max()
+    return 0 if pd.isna(max_val) else max_val
 
-    fig.update_layout(
-        title="Water Injection vs Oil Production History",
-        xaxis=dict(title="Date (month)"),
-        yaxis=dict(title="Water Injection M3", range=[0, max_val]),
-        yaxis2=dict(title="Oil Production M3", overlaying="y", side="right", range=[0, max_val])
+# --------------------------------------------------
+# Function to merge many wells' lines into a single trace
+# --------------------------------------------------
+# Above this many wells a per-well legend is unreadable, so lines are merged
+MERGE_LINE_TRACES_ABOVE = 10
+
+
+def merged_line_trace(df, wells, column, series_name, yaxis="y", **style):
+    # A NaN row after each well breaks the line between wells, and
+    # customdata keeps every point's UWI for the hover label
+    xs, ys, uwis = [], [], []
+    for well in wells:
+        data = well_rows(df, well)
+        xs += [data["Date"].to_numpy(), np.array([np.datetime64("NaT")])]
+        ys += [data[column].to_numpy(), np.full(1, np.nan, dtype=np.float32)]
+        uwis.append(np.full(len(data) + 1, str(well), dtype=object))
+
+    trace = dict(
+        type="scattergl",
+        x=np.concatenate(xs),
+        y=np.concatenate(ys),
+        customdata=np.concatenate(uwis),
+        hovertemplate="UWI %{customdata}<br>%{x}<br>%{y}<extra></extra>",
+        name=f"{series_name} ({len(wells)} wells)",
+        mode="lines+markers",
+        yaxis=yaxis,
+        **style
     )
-    return fig
+    return trace
 
 # --------------------------------------------------
-# Function to plot Gas Production vs Water Injection History
+# Function to build one trace per selected well
 # --------------------------------------------------
-def plot_gas_inj_prod(prod_df, inj_df, prod_wells, inj_wells):
-    fig = go.Figure()
+def well_traces(df, wells, column, kind, name, series_name, yaxis="y", first_color=None, **style):
+    # Plain trace dicts; `name` is formatted with the UWI and `first_color`
+    # only applies to the first well. A merged line has no first well, so it
+    # keeps the default colour and is labelled with `series_name`.
+    if kind == "line" and len(wells) > MERGE_LINE_TRACES_ABOVE:
+        return [merged_line_trace(df, wells, column, series_name, yaxis, **style)]
+
+    traces = []
+    for i, well in enumerate(wells):
+        data = well_rows(df, well)
+        color = first_color if i == 0 else None
+
+        trace = dict(
+            x=data["Date"].to_numpy(),
+            y=data[column].to_numpy(),
+            name=name.format(well=well),
+            yaxis=yaxis,
+            **style
+        )
+        if kind == "bar":
+            trace["type"] = "bar"
+            if color:
+                trace["marker"] = dict(color=color)
+        else:
+            trace["type"] = "scatter"
+            trace["mode"] = "lines+markers"
+            if color:
+                trace["line"] = dict(color=color)
+        traces.append(trace)
+    return traces
 
-    # Gas production bars
-    for i, well in enumerate(prod_wells):
-        data = prod_df[prod_df["UWI"] == well]
-        gas_color = "green" if i == 0 else None  # first well = green
-
-        fig.add_trace(go.Bar(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Gas E3M3"],
-            name=f"Gas Production from well {well}",
-            yaxis="y2",
-            marker=dict(color=gas_color) if gas_color else {}
-        ))
+# --------------------------------------------------
+# Function to cache a history figure as a plain spec
+# --------------------------------------------------
+def cache_figure(build_spec):
+    # Cache the dict spec, not the go.Figure: an unpickled Figure is
+    # re-validated on every cache hit
+    cached_spec = st.cache_data(max_entries=8, show_spinner=False)(build_spec)
+
+    @functools.wraps(build_spec)
+    def plot(*args, **kwargs):
+        # The spec is built from known-clean columns, so skip Plotly's
+        # per-property validation when assembling the figure
+        return go.Figure(cached_spec(*args, **kwargs), _validate=False)
+    return plot
 
-    # Water injection lines
-    for well in inj_wells:
-        data = inj_df[inj_df["UWI"] == well]
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Water Inj M3"],
-            name=f"Water Injection into Well {well}",
-            mode="lines+markers"
-        ))
+# --------------------------------------------------
+# Function to lay out a dual-axis history figure
+# --------------------------------------------------
+def build_paired_spec(title, traces, max_val, y_title, y2_title, barmode=None):
+    # Titles use the canonical {"text": ...} form: the spec skips validation,
+    # so the bare-string shorthand would never be expanded
+    layout = dict(
+        title=dict(text=title),
+        xaxis=dict(title=dict(text="Date (month)")),
+        yaxis=dict(title=dict(text=y_title), range=[0, max_val]),
+        yaxis2=dict(title=dict(text=y2_title), overlaying="y", side="right", range=[0, max_val]),
+        # Keep the user's zoom/pan when Streamlit reruns the script
+        uirevision=title
+    )
+    if barmode:
+        layout["barmode"] = barmode
 
-    max_val = 0
-    if prod_wells:
-        max_val = max(max_val, prod_df[prod_df["UWI"].isin(prod_wells)]["Gas E3M3"].max())
-    if inj_wells:
-        max_val = max(max_val, inj_df[inj_df["UWI"].isin(inj_wells)]["Water Inj M3"].max())
+    return {"data": traces, "layout": layout}
 
-    fig.update_layout(
-        title="Water Injection vs Gas Production History",
-        xaxis=dict(title="Date (month)"),
-        yaxis=dict(title="Water Injection M3", range=[0, max_val]),
-        yaxis2=dict(title="Gas Production M3", overlaying="y", side="right", range=[0, max_val]),
-        barmode="overlay"
+# --------------------------------------------------
+# Function to plot Water Injection vs Water Production History
+# --------------------------------------------------
+@cache_figure
+def plot_water_inj_prod(history_key, _prod_df, _inj_df, prod_wells, inj_wells):
+    traces = (
+        well_traces(_prod_df, prod_wells, "Water M3", "bar",
+                    "Water Production from well {well}", "Water Production", yaxis="y2")
+        + well_traces(_inj_df, inj_wells, "Water Inj M3", "line",
+                      "Water Injection into Well {well}", "Water Injection")
     )
-    return fig
+    max_val = max(
+        max_for_wells(_prod_df, "Water M3", prod_wells),
+        max_for_wells(_inj_df, "Water Inj M3", inj_wells)
+    )
+    return build_paired_spec("Water Injection vs Water Production History", traces, max_val,
+                             "Water Injection M3", "Water Production M3", barmode="overlay")
 
 # --------------------------------------------------
-# Function to plot Oil vs Water Production History
+# Function to plot Oil Production vs Water Injection History
 # --------------------------------------------------
-def plot_oil_water_prod(prod_df, prod_wells):
-    fig = go.Figure()
-
-    for well in prod_wells:
-        data = prod_df[prod_df["UWI"] == well]
-        oil_color = "brown" if len(prod_wells) == 1 else None
-
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Oil M3"],
-            name=f"Oil Production {well}",
-            mode="lines+markers",
-            yaxis="y1",
-            line=dict(color=oil_color) if oil_color else {}
-        ))
-
-        fig.add_trace(go.Bar(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Water M3"],
-            name=f"Water Production {well}",
-            yaxis="y2",
-            opacity=0.5
-        ))
+@cache_figure
+def plot_oil_inj_prod(history_key, _prod_df, _inj_df, prod_wells, inj_wells):
+    traces = (
+        well_traces(_prod_df, prod_wells, "Oil M3", "line",
+                    "Oil Production from well {well}", "Oil Production", yaxis="y2", first_color="brown")
+        + well_traces(_inj_df, inj_wells, "Water Inj M3", "line",
+                      "Water Injection into Well {well}", "Water Injection", first_color="blue")
+    )
+    max_val = max(
+        max_for_wells(_prod_df, "Oil M3", prod_wells),
+        max_for_wells(_inj_df, "Water Inj M3", inj_wells)
+    )
+    return build_paired_spec("Water Injection vs Oil Production History", traces, max_val,
+                             "Water Injection M3", "Oil Production M3")
 
-    max_val = 0
-    if prod_wells:
-        max_val = max(
-            prod_df[prod_df["UWI"].isin(prod_wells)]["Oil M3"].max(),
-            prod_df[prod_df["UWI"].isin(prod_wells)]["Water M3"].max()
-        )
+# --------------------------------------------------
+# Function to plot Gas Production vs Water Injection History
+# --------------------------------------------------
+@cache_figure
+def plot_gas_inj_prod(history_key, _prod_df, _inj_df, prod_wells, inj_wells):
+    traces = (
+        well_traces(_prod_df, prod_wells, "Gas E3M3", "bar",
+                    "Gas Production from well {well}", "Gas Production", yaxis="y2", first_color="green")
+        + well_traces(_inj_df, inj_wells, "Water Inj M3", "line",
+                      "Water Injection into Well {well}", "Water Injection")
+    )
+    max_val = max(
+        max_for_wells(_prod_df, "Gas E3M3", prod_wells),
+        max_for_wells(_inj_df, "Water Inj M3", inj_wells)
+    )
+    return build_paired_spec("Water Injection vs Gas Production History", traces, max_val,
+                             "Water Injection M3", "Gas Production M3", barmode="overlay")
 
-    fig.update_layout(
-        title="Oil vs Water Production History",
-        xaxis=dict(title="Date (month)"),
-        yaxis=dict(title="Oil Production M3", range=[0, max_val]),
-        yaxis2=dict(title="Water Production M3", overlaying="y", side="right", range=[0, max_val]),
-        barmode="overlay"
+# --------------------------------------------------
+# Function to plot Oil vs Water Production History
+# --------------------------------------------------
+@cache_figure
+def plot_oil_water_prod(history_key, _prod_df, prod_wells):
+    oil_color = "brown" if len(prod_wells) == 1 else None
+    traces = (
+        well_traces(_prod_df, prod_wells, "Oil M3", "line",
+                    "Oil Production {well}", "Oil Production", first_color=oil_color)
+        + well_traces(_prod_df, prod_wells, "Water M3", "bar",
+                      "Water Production {well}", "Water Production", yaxis="y2", opacity=0.5)
     )
-    return fig
+    max_val = max(
+        max_for_wells(_prod_df, "Oil M3", prod_wells),
+        max_for_wells(_prod_df, "Water M3", prod_wells)
+    )
+    return build_paired_spec("Oil vs Water Production History", traces, max_val,
+                             "Oil Production M3", "Water Production M3", barmode="overlay")
 
 # --------------------------------------------------
 # Function to plot Gas vs Water Production History
 # --------------------------------------------------
-def plot_gas_water_prod(prod_df, prod_wells):
-    fig = go.Figure()
-
-    for i, well in enumerate(prod_wells):
-        data = prod_df[prod_df["UWI"] == well]
-        gas_color = "green" if i == 0 else None  # first well = green
-
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Gas E3M3"],
-            name=f"Gas Production {well}",
-            mode="lines+markers",
-            yaxis="y1",
-            line=dict(color=gas_color) if gas_color else {}
-        ))
-
-        fig.add_trace(go.Bar(
-            x=pd.to_datetime(data["Date"], errors="coerce"),
-            y=data["Water M3"],
-            name=f"Water Production {well}",
-            yaxis="y2",
-            opacity=0.5
-        ))
-
-    max_val = 0
-    if prod_wells:
-        max_val = max(
-            prod_df[prod_df["UWI"].isin(prod_wells)]["Gas E3M3"].max(),
-            prod_df[prod_df["UWI"].isin(prod_wells)]["Water M3"].max()
-        )
-
-    fig.update_layout(
-        title="Gas vs Water Production History",
-        xaxis=dict(title="Date (month)"),
-        yaxis=dict(title="Gas Production M3", range=[0, max_val]),
-        yaxis2=dict(title="Water Production M3", overlaying="y", side="right", range=[0, max_val]),
-        barmode="overlay"
+@cache_figure
+def plot_gas_water_prod(history_key, _prod_df, prod_wells):
+    traces = (
+        well_traces(_prod_df, prod_wells, "Gas E3M3", "line",
+                    "Gas Production {well}", "Gas Production", first_color="green")
+        + well_traces(_prod_df, prod_wells, "Water M3", "bar",
+                      "Water Production {well}", "Water Production", yaxis="y2", opacity=0.5)
     )
-    return fig
+    max_val = max(
+        max_for_wells(_prod_df, "Gas E3M3", prod_wells),
+        max_for_wells(_prod_df, "Water M3", prod_wells)
+    )
+    return build_paired_spec("Gas vs Water Production History", traces, max_val,
+                             "Gas Production M3", "Water Production M3", barmode="overlay")
 
 
 
@@ -490,8 +716,7 @@ inj_file = st.sidebar.file_uploader("Upload Injection History CSV", type=["csv"]
 
 if welllist_file and prod_file and inj_file:
     df_welllist = read_csv_file(welllist_file)
-    df_prod = read_csv_file(prod_file)
-    df_inj = read_csv_file(inj_file)
+    df_prod, df_inj = read_history_files(prod_file, inj_file)
    
     if df_welllist is not None and df_prod is not None and df_inj is not None:
         if not validate_uploaded_files(df_welllist, df_prod, df_inj):
@@ -507,14 +732,23 @@ if welllist_file and prod_file and inj_file:
         include_unknown = st.radio(
             "Include Unknown Well_Type?", ["Yes", "No"], index=1, horizontal=True
         ) == "Yes"
+
+        # Cache keys for everything derived from the uploads
+        wells_key = upload_key(welllist_file, prod_file, inj_file)
+        history_key = upload_key(prod_file, inj_file)
+
+        df_wells = prepare_well_data(wells_key, df_welllist, df_prod, df_inj, include_unknown)
+        density_map = len(df_wells) > DENSITY_MAP_MIN_WELLS
+
         label_mode = st.radio(
-            "Label Display Mode", ["Hover tooltips", "Visible labels"], index=1, horizontal=True
+            "Label Display Mode", ["Hover tooltips", "Visible labels"], index=1, horizontal=True,
+            disabled=density_map,
+            help="Not used for large well lists, which are drawn as a density map." if density_map else None
         )
 
-        df_wells = prepare_well_data(df_welllist, df_prod, df_inj, include_unknown)
-
-        fig_map = plot_well_map(df_wells, label_mode)
-        st.plotly_chart(fig_map, use_container_width=True)
+        # Filled in once the wells below are selected, so a density map can
+        # highlight them
+        map_slot = st.container()
 
         st.subheader("Well ID to UWI Mapping")
         st.dataframe(df_wells[["UWI", "Well_ID", "Well_Type", "Deviation_Type"]])
@@ -523,35 +757,46 @@ if welllist_file and prod_file and inj_file:
         inj_wells = st.multiselect("Select Injection Wells (UWI)", sorted(df_inj["UWI"].unique()))
         prod_wells = st.multiselect("Select Production Wells (UWI)", sorted(df_prod["UWI"].unique()))
 
+        with map_slot:
+            if density_map:
+                st.caption(
+                    "Large well list: showing well density, with the selected wells on top. "
+                    "Label Display Mode does not apply."
+                )
+                fig_map = plot_well_density_map(wells_key, include_unknown, df_wells, prod_wells + inj_wells)
+            else:
+                fig_map = plot_well_map(df_wells, label_mode)
+            st.plotly_chart(fig_map, use_container_width=True)
+
         #if prod_wells or inj_wells:
         if prod_wells or inj_wells:
             if prod_wells and inj_wells:
-                fig1 = plot_water_inj_prod(df_prod, df_inj, prod_wells, inj_wells)
+                fig1 = plot_water_inj_prod(history_key, df_prod, df_inj, prod_wells, inj_wells)
                 st.plotly_chart(fig1, use_container_width=True)
 
-                fig3 = plot_gas_inj_prod(df_prod, df_inj, prod_wells, inj_wells)
+                fig3 = plot_gas_inj_prod(history_key, df_prod, df_inj, prod_wells, inj_wells)
                 st.plotly_chart(fig3, use_container_width=True)
  
-                fig_oil_inj = plot_oil_inj_prod(df_prod, df_inj, prod_wells, inj_wells)
+                fig_oil_inj = plot_oil_inj_prod(history_key, df_prod, df_inj, prod_wells, inj_wells)
                 st.plotly_chart(fig_oil_inj, use_container_width=True)
 
             elif inj_wells:
-                fig1 = plot_water_inj_prod(df_prod, df_inj, prod_wells, inj_wells)
+                fig1 = plot_water_inj_prod(history_key, df_prod, df_inj, prod_wells, inj_wells)
                 st.plotly_chart(fig1, use_container_width=True)
 
             if prod_wells:
-                fig2 = plot_oil_water_prod(df_prod, prod_wells)
+                fig2 = plot_oil_water_prod(history_key, df_prod, prod_wells)
                 st.plotly_chart(fig2, use_container_width=True)
 
-                fig4 = plot_gas_water_prod(df_prod, prod_wells)
+                fig4 = plot_gas_water_prod(history_key, df_prod, prod_wells)
                 st.plotly_chart(fig4, use_container_width=True)
 
         st.subheader("Select UWI for Statistical Aanalysis")
         selected_uwis = st.multiselect("Select Wells (UWI) for Statistics and Analysis", sorted(df_prod["UWI"].unique())
         )# Filter the datasets if wells are selected
         if selected_uwis:
-            df_prod_selected = df_prod[df_prod["UWI"].isin(selected_uwis)]
-            df_inj_selected = df_inj[df_inj["UWI"].isin(selected_uwis)]
+            df_prod_selected = select_wells(df_prod, selected_uwis)
+            df_inj_selected = select_wells(df_inj, selected_uwis)
             display_statistics_and_analysis(df_prod_selected, df_inj_selected)
 
 